@@ -28,13 +28,6 @@ from config import (
 )
 from db import init_db, load_complaints, add_complaint
 
-from modules import (
-    solution_heat_map, # <--- New file name (without .py)
-    statistics_page,
-    air_heatmap_page,
-    about_page,
-)
-
 # ---------------------------------------------------------
 # AUTHORITY CONTACTS (Hyderabad)
 # ---------------------------------------------------------
@@ -377,7 +370,11 @@ def main():
         if key == "map":
             solution_heat_map.render(df_all)
         elif key == "stats":
-            statistics_page.render(df_all)
+            # The statistics page never shows description/photo text, so
+            # skip materializing those columns.
+            statistics_page.render(
+                load_complaints(columns=("id", "issue_type", "intensity", "timestamp"))
+            )
         elif key == "air":
             air_heatmap_page.render()
         elif key == "about":
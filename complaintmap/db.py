@@ -2,15 +2,39 @@ import sqlite3
 from datetime import datetime
 
 import pandas as pd
+import streamlit as st
 
 from config import DB_PATH
 
 
+@st.cache_resource
+def get_connection():
+    """
+    Return the shared SQLite connection (one per process).
+
+    Opening a connection per call pays file-open and schema-parse costs on
+    every rerun; a cached singleton avoids that. `check_same_thread=False`
+    is safe here because Streamlit serializes script runs.
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    # WAL lets readers proceed during writes and batches fsyncs; the journal
+    # mode is persistent per-database but is set defensively on every startup.
+    conn.executescript(
+        """
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-64000;
+        """
+    )
+    return conn
+
+
 def init_db():
     """
     Create the SQLite database and the `complaints` table if it does not already exist.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
     c.execute(
         """
@@ -20,58 +44,119 @@ def init_db():
             intensity INTEGER,
             lat REAL NOT NULL,
             lon REAL NOT NULL,
-            timestamp TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
             description TEXT,
             photo_path TEXT,
             votes INTEGER DEFAULT 0
         )
         """
     )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_complaints_filter
+        ON complaints(issue_type, intensity, timestamp)
+        """
+    )
+    c.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_complaints_latlon
+        ON complaints(lat, lon)
+        """
+    )
     conn.commit()
-    conn.close()
 
 
-def get_connection():
+def add_complaints(rows):
     """
-    Return a new SQLite connection.
+    Insert a batch of complaints in one transaction.
+
+    `rows` is an iterable of (issue_type, intensity, lat, lon, timestamp,
+    description, photo_path) tuples. executemany prepares the statement once
+    and the single commit means one fsync regardless of batch size.
     """
-    return sqlite3.connect(DB_PATH)
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO complaints (issue_type, intensity, lat, lon, timestamp, description, photo_path, votes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+            """,
+            rows,
+        )
+    load_complaints.clear()
 
 
 def add_complaint(issue_type, intensity, lat, lon, description, photo_path):
     """
     Insert a new complaint into the database.
     """
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute(
-        """
-        INSERT INTO complaints (issue_type, intensity, lat, lon, timestamp, description, photo_path, votes)
-        VALUES (?, ?, ?, ?, ?, ?, ?, 0)
-        """,
-        (
-            issue_type,
-            intensity,
-            lat,
-            lon,
-            datetime.now().isoformat(),
-            description,
-            photo_path,
-        ),
+    add_complaints(
+        [
+            (
+                issue_type,
+                intensity,
+                lat,
+                lon,
+                int(datetime.now().timestamp()),
+                description,
+                photo_path,
+            )
+        ]
     )
-    conn.commit()
-    conn.close()
 
 
-def load_complaints():
+@st.cache_data(ttl=60)
+def load_complaints(types=None, min_intensity=None, since=None, bbox=None,
+                    columns=None):
     """
-    Load all complaints as a pandas DataFrame.
+    Load complaints as a pandas DataFrame, optionally filtered in SQL.
+
+    `types` is an iterable of issue types, `min_intensity` an inclusive lower
+    bound, `since` a date/datetime lower bound and `bbox` a visible-viewport
+    box `(lat_min, lat_max, lon_min, lon_max)`. Filters are pushed down to
+    SQLite so they use the indexes instead of an in-memory scan. `columns`
+    narrows the SELECT so views that never show description/photo text do
+    not pay to materialize those strings.
+
+    Results are cached between Streamlit reruns; `add_complaint` invalidates
+    the cache so new reports show up immediately.
     """
+    query = "SELECT {} FROM complaints".format(
+        ",".join(columns) if columns else "*"
+    )
+    clauses = []
+    params = []
+    if types is not None:
+        clauses.append(
+            "issue_type IN ({})".format(",".join("?" * len(types)))
+        )
+        params.extend(types)
+    if min_intensity is not None:
+        clauses.append("intensity >= ?")
+        params.append(min_intensity)
+    if since is not None:
+        # Timestamps are stored as unix epoch seconds.
+        if not isinstance(since, datetime):
+            since = datetime.combine(since, datetime.min.time())
+        clauses.append("timestamp >= ?")
+        params.append(int(since.timestamp()))
+    if bbox is not None:
+        lat_min, lat_max, lon_min, lon_max = bbox
+        clauses.append("lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?")
+        params.extend([lat_min, lat_max, lon_min, lon_max])
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+
     conn = get_connection()
-    df = pd.read_sql_query("SELECT * FROM complaints", conn)
-    conn.close()
+    df = pd.read_sql_query(query, conn, params=params or None)
+
+    if not df.empty and "timestamp" in df.columns:
+        # Epoch int -> datetime64 is a single C cast, unlike ISO string parsing.
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s")
 
-    if not df.empty:
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
+    if not df.empty and "issue_type" in df.columns:
+        # Low-cardinality column: categorical codes make the downstream
+        # isin/unique/map operations work on small ints, not string objects.
+        df["issue_type"] = df["issue_type"].astype("category")
 
     return df
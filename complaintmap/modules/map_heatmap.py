@@ -1,9 +1,98 @@
+import copy
+
 import folium
+import numpy as np
+import pandas as pd
 import streamlit as st
-from folium.plugins import HeatMap
+from folium.plugins import FastMarkerCluster, HeatMap
 from streamlit_folium import st_folium
 
 from config import COLOR_MAP, DEFAULT_ZOOM
+from db import load_complaints
+
+# Client-side marker factory: one JS callback applied to a single data array
+# instead of serializing one folium object per complaint.
+MARKER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+        {radius: 6, color: row[2], fill: true, fillOpacity: 0.8});
+    marker.bindPopup(row[3]);
+    return marker;
+};
+"""
+
+
+@st.cache_resource
+def _map_template(lat, lon, zoom):
+    """
+    Empty base map cached per (rounded center, zoom).
+
+    The tile-layer boilerplate never changes between reruns; callers clone
+    the template before adding their own layers.
+    """
+    return folium.Map(location=[lat, lon], zoom_start=zoom)
+
+
+@st.cache_resource
+def _build_map(df_hash, use_heatmap, _df):
+    """
+    Build the folium map for the given complaint set.
+
+    `df_hash` is the cache key for the (unhashable) DataFrame `_df`, so the
+    N marker constructions only run when the filtered data actually changes.
+    """
+    # Round the center so small filter changes still hit the template cache.
+    base_map = copy.deepcopy(
+        _map_template(
+            round(_df["lat"].mean(), 3),
+            round(_df["lon"].mean(), 3),
+            DEFAULT_ZOOM,
+        )
+    )
+
+    # Assemble popup HTML with pandas string kernels instead of per-row
+    # Python concatenation; the optional lines are added via np.where.
+    popup = (
+        "<b>Type:</b> " + _df["issue_type"].astype(str)
+        + "<br><b>Intensity:</b> " + _df["intensity"].astype(str) + " / 5"
+        + "<br><b>Date:</b> " + _df["timestamp"].astype(str)
+    )
+    description = _df["description"].fillna("")
+    popup = popup + np.where(
+        description != "", "<br><b>Description:</b> " + description, ""
+    )
+    photo_path = _df["photo_path"].fillna("")
+    popup = popup + np.where(
+        photo_path != "", "<br><b>Photo:</b> " + photo_path, ""
+    )
+    # Map issue types to colors with one C-level hash join rather than a
+    # dict.get per row inside the marker loop.
+    color = _df["issue_type"].map(COLOR_MAP).fillna("black")
+    _df = _df.assign(popup_html=popup, marker_color=color)
+
+    # itertuples avoids building a Series per row, unlike iterrows
+    marker_data = [
+        [row.lat, row.lon, row.marker_color, row.popup_html]
+        for row in _df.itertuples(index=False)
+    ]
+    FastMarkerCluster(marker_data, callback=MARKER_CALLBACK).add_to(base_map)
+
+    if use_heatmap:
+        # Pre-aggregate into a fixed grid: the browser receives only the
+        # non-empty bin centers, a payload that stays bounded by bins**2 no
+        # matter how many complaints exist.
+        weight, lat_edges, lon_edges = np.histogram2d(
+            _df["lat"], _df["lon"], bins=256, weights=_df["intensity"]
+        )
+        lat_centers = (lat_edges[:-1] + lat_edges[1:]) / 2.0
+        lon_centers = (lon_edges[:-1] + lon_edges[1:]) / 2.0
+        ii, jj = np.nonzero(weight)
+        heat_data = np.column_stack(
+            [lat_centers[ii], lon_centers[jj], weight[ii, jj]]
+        ).tolist()
+        HeatMap(heat_data, radius=15, blur=10).add_to(base_map)
+
+    return base_map
 
 
 def render(df_all):
@@ -15,12 +104,14 @@ def render(df_all):
 
     st.subheader("Filters")
 
+    types_sorted = sorted(pd.unique(df_all["issue_type"]))
+
     colf1, colf2, colf3 = st.columns(3)
     with colf1:
         type_filter = st.multiselect(
             "Issue types",
-            options=sorted(df_all["issue_type"].unique()),
-            default=list(sorted(df_all["issue_type"].unique())),
+            options=types_sorted,
+            default=types_sorted,
         )
     with colf2:
         intensite_min = st.slider("Minimum intensity", 1, 5, 1)
@@ -30,46 +121,62 @@ def render(df_all):
             value=df_all["timestamp"].min().date() if not df_all.empty else None,
         )
 
-    df = df_all[
-        (df_all["issue_type"].isin(type_filter))
-        & (df_all["intensity"] >= intensite_min)
-        & (df_all["timestamp"].dt.date >= date_min)
-    ]
+    if not type_filter:
+        st.warning("No reports match these filters.")
+        return
+
+    # With everything at its default, df_all already holds every row; skip
+    # the re-query (and its cache lookup) entirely on that common rerun.
+    bbox = st.session_state.get("map_bounds")
+    no_filter_active = (
+        len(type_filter) == len(types_sorted)
+        and intensite_min == 1
+        and date_min == df_all["timestamp"].min().date()
+        and bbox is None
+    )
+    if no_filter_active:
+        df = df_all
+    else:
+        # Push the filters down to SQLite, where they hit the composite
+        # index, instead of materializing a boolean mask over the full
+        # DataFrame. The bbox from the previous rerun limits the query to
+        # the visible viewport.
+        df = load_complaints(
+            types=tuple(type_filter),
+            min_intensity=intensite_min,
+            since=date_min,
+            bbox=bbox,
+        )
+    if df.empty and bbox is not None:
+        # The user panned to an empty area; fall back to the full extent so
+        # the map never renders without any reference points.
+        df = load_complaints(
+            types=tuple(type_filter),
+            min_intensity=intensite_min,
+            since=date_min,
+        )
 
     if df.empty:
         st.warning("No reports match these filters.")
         return
 
-    center = [df["lat"].mean(), df["lon"].mean()]
-    base_map = folium.Map(location=center, zoom_start=DEFAULT_ZOOM)
-
-    for _, row in df.iterrows():
-        popup_lines = [
-            f"<b>Type:</b> {row['issue_type']}",
-            f"<b>Intensity:</b> {row['intensity']} / 5",
-            f"<b>Date:</b> {row['timestamp']}",
-        ]
-        if row["description"]:
-            popup_lines.append(f"<b>Description:</b> {row['description']}")
-        if row["photo_path"]:
-            popup_lines.append(f"<b>Photo:</b> {row['photo_path']}")
-        popup_html = "<br>".join(popup_lines)
-
-        folium.CircleMarker(
-            location=[row["lat"], row["lon"]],
-            radius=6,
-            color=COLOR_MAP.get(row["issue_type"], "black"),
-            fill=True,
-            fill_opacity=0.8,
-            popup=popup_html,
-        ).add_to(base_map)
-
     st.markdown("### Display options")
     use_heatmap = st.checkbox("Also display heatmap (density of issues)")
-    if use_heatmap:
-        heat_data = [
-            [row["lat"], row["lon"], row["intensity"]] for _, row in df.iterrows()
-        ]
-        HeatMap(heat_data, radius=15, blur=10).add_to(base_map)
 
-    st_folium(base_map, width=900, height=600)
+    # Rebuilding N markers on every rerun is wasted work when the user only
+    # toggled a widget; key the cached map on the data content instead.
+    df_hash = int(pd.util.hash_pandas_object(df).sum())
+    base_map = _build_map(df_hash, use_heatmap, df)
+
+    map_state = st_folium(
+        base_map, width=900, height=600, returned_objects=["bounds"]
+    )
+
+    # Remember the visible bounds so the next rerun only queries that bbox.
+    bounds = (map_state or {}).get("bounds") or {}
+    sw = bounds.get("_southWest")
+    ne = bounds.get("_northEast")
+    if sw and ne:
+        st.session_state["map_bounds"] = (
+            sw["lat"], ne["lat"], sw["lng"], ne["lng"]
+        )
@@ -1,15 +1,25 @@
+import functools
+import hashlib
+import io
 import math
 import requests
-import pandas as pd
-import streamlit as st 
+import streamlit as st
 import numpy as np
 
-try:
-    import folium
-    from streamlit_folium import st_folium
-    FOLIUM_OK = True
-except Exception:
-    FOLIUM_OK = False
+
+@functools.lru_cache(maxsize=1)
+def _folium_modules():
+    """Probe for the optional map stack lazily, once per process.
+
+    Importing folium/streamlit_folium at module load costs time on every
+    cold start even when the user never opens the map.
+    """
+    try:
+        import folium
+        from streamlit_folium import st_folium
+        return folium, st_folium
+    except Exception:
+        return None, None
 
 # Map center and initial coordinates for the user.
 LYON_LAT = 45.76
@@ -28,9 +38,16 @@ def is_within_france(lat, lon):
     """Checks if coordinates are within the approximate bounding box of France."""
     return (MIN_LAT <= lat <= MAX_LAT) and (MIN_LON <= lon <= MAX_LON)
 
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
 def nominatim(q, limit=5):
-    """Searches for an address using OpenStreetMap Nominatim, results focused on France."""
-    if not q or len(q) < 3:
+    """Searches for an address using OpenStreetMap Nominatim, results focused on France.
+
+    Results are memoized per query so reruns and retyped queries skip the
+    network round-trip entirely.
+    """
+    # Normalize so "Lyon" and "lyon " share one cache entry.
+    q = (q or "").strip().lower()
+    if len(q) < 3:
         return []
     try:
         # Adding country code 'fr' to limit results to France
@@ -52,6 +69,102 @@ def suggest_tilt(lat):
     return max(5.0, min(60.0, t))
 
 
+def svg_grid_preview(rows, cols, n, cell_px=18):
+    """
+    Compact SVG preview of `n` panels laid out on a rows × cols grid.
+
+    One template rect in <defs> is stamped with <use> references, so the
+    markup stays a few bytes per panel instead of a full <rect> each, and
+    the coordinates come from a single NumPy mesh rather than per-cell
+    formatting logic.
+    """
+    xs = 10 + np.arange(cols) * cell_px
+    ys = 10 + np.arange(rows) * cell_px
+    xx, yy = np.meshgrid(xs, ys)
+    uses = "".join(
+        f'<use href="#p" x="{x}" y="{y}"/>'
+        for x, y in zip(xx.ravel().tolist()[:n], yy.ravel().tolist()[:n])
+    )
+    width = 20 + cols * cell_px
+    height = 20 + rows * cell_px
+    return (
+        f'<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg">'
+        f'<defs><rect id="p" width="{cell_px - 2}" height="{cell_px - 2}"'
+        ' fill="#1f77b4" stroke="#033"/></defs>'
+        f"{uses}</svg>"
+    )
+
+
+def mixed_fill(eff_area, wp, panel_area):
+    """
+    Exact best panel mix for the effective area (unbounded knapsack DP).
+
+    Maximizes installed Wp subject to the area budget, with the area
+    quantized to cells of at most 0.01 m² (coarser only for very large
+    roofs so the table stays small). Unlike a greedy density fill this is
+    the true optimum, and a few thousand capacity cells times six panel
+    types still solves in well under a millisecond.
+
+    `wp` and `panel_area` are aligned NumPy arrays; returns (counts,
+    area_used) with counts aligned to them.
+    """
+    cell = max(0.01, float(eff_area) / 5000.0)
+    # The epsilon guards against float truncation (30.0 // 0.01 == 2999).
+    cap = int(eff_area / cell + 1e-9)
+    # Ceil the weights so quantization can never overpack the roof.
+    w = np.ceil(panel_area / cell - 1e-9).astype(np.int64)
+    dp = np.zeros(cap + 1)
+    take = np.full(cap + 1, -1, dtype=np.int64)
+    for c in range(1, cap + 1):
+        dp[c] = dp[c - 1]
+        for i in range(len(wp)):
+            if w[i] <= c and dp[c - w[i]] + wp[i] > dp[c]:
+                dp[c] = dp[c - w[i]] + wp[i]
+                take[c] = i
+
+    counts = np.zeros(len(wp), dtype=np.int64)
+    c = cap
+    while c > 0:
+        i = take[c]
+        if i < 0:
+            c -= 1
+        else:
+            counts[i] += 1
+            c -= w[i]
+    return counts, float((counts * panel_area).sum())
+
+
+# Static panel catalog, kept as dicts for the UI plus a NumPy SoA so the
+# numeric paths never rebuild per-call arrays.
+PANEL_CATALOG = (
+    {"name": "400W", "Wp": 400.0, "area": 2.0},
+    {"name": "330W", "Wp": 330.0, "area": 1.7},
+    {"name": "275W", "Wp": 275.0, "area": 1.6},
+    {"name": "200W", "Wp": 200.0, "area": 1.2},
+    {"name": "100W", "Wp": 100.0, "area": 0.6},
+    {"name": "50W",  "Wp": 50.0,  "area": 0.3},
+)
+PANEL_NAMES = tuple(p["name"] for p in PANEL_CATALOG)
+PANEL_WP = np.array([p["Wp"] for p in PANEL_CATALOG])
+PANEL_AREA = np.array([p["area"] for p in PANEL_CATALOG])
+PANEL_DENSITY = PANEL_WP / PANEL_AREA
+PANEL_BY_NAME = {p["name"]: p for p in PANEL_CATALOG}
+
+
+@st.cache_resource
+def _location_map(lat, lon):
+    """
+    Selection map cached per (rounded) coordinate.
+
+    Reruns that only touch other widgets reuse the cached object instead of
+    rebuilding the map and re-shipping its payload to the browser.
+    """
+    folium, _ = _folium_modules()
+    m = folium.Map(location=[lat, lon], zoom_start=14)
+    folium.Marker([lat, lon]).add_to(m)
+    return m
+
+
 # --- Main Render Function ---
 
 def render():
@@ -77,9 +190,19 @@ def render():
     # --- ADDRESS SEARCH ---
     q = st.text_input("Search address (Please enter your location:)", "")
     if q:
-        res = nominatim(q)
+        # Only hit the (cached) search when the query actually changed;
+        # unchanged reruns reuse the list already in session state.
+        if st.session_state.get("last_suggestion_query") != q:
+            st.session_state["last_suggestion_query"] = q
+            st.session_state["last_suggestions"] = nominatim(q)
+        res = st.session_state["last_suggestions"]
         for r in res:
-            if st.button(r["name"], key=r["name"]):
+            # Short, deterministic widget key: long display names make poor
+            # keys and Python's salted hash() changes between processes.
+            key = "s_" + hashlib.blake2b(
+                r["name"].encode("utf-8"), digest_size=8
+            ).hexdigest()
+            if st.button(r["name"], key=key):
                 new_lat, new_lon = r["lat"], r["lon"]
                 
                 # Check bounds for search result (safety check)
@@ -91,17 +214,18 @@ def render():
                     st.session_state.computation_done = False
     
     # --- MAP CENTERING ON LYON ---
-    if FOLIUM_OK:
+    folium, st_folium = _folium_modules()
+    if folium is not None:
         st.write("Click map to select coordinates:")
-    
+
         # Map starts centered on the current lat/lon (Lyon by default)
-        m = folium.Map(location=[st.session_state.lat, st.session_state.lon], zoom_start=14)
-    
-        # Add a marker for the current selection
-        folium.Marker([st.session_state.lat, st.session_state.lon]).add_to(m)
-        
-        # Set width to 100% and a good height
-        out = st_folium(m, width='100%', height=650, returned_objects=["last_clicked"]) 
+        m = _location_map(
+            round(st.session_state.lat, 4), round(st.session_state.lon, 4)
+        )
+
+        # The stable key lets Streamlit keep the iframe mounted across reruns
+        out = st_folium(m, width='100%', height=650,
+                        returned_objects=["last_clicked"], key="solar_map")
         
         if out and out.get("last_clicked"):
             lat = out["last_clicked"]["lat"]; lon = out["last_clicked"]["lng"]
@@ -140,61 +264,59 @@ def render():
 
     # --- roof & demand
     st.subheader("2) Roof & demand")
-    left, right = st.columns(2)
-    with left:
-        method = st.radio("Roof input", ("Length × Width", "Usable area (m²)"))
-        if method == "Length × Width":
-            length = st.number_input("Length (m)", value=8.0, min_value=0.5, step=0.1, format="%.2f")
-            width = st.number_input("Width (m)", value=6.0, min_value=0.5, step=0.1, format="%.2f")
-            usable = float(length * width)
-            st.write(f"Area: **{usable:.1f} m²**")
-        else:
-            usable = st.number_input("Usable area (m²)", value=40.0, min_value=0.1, step=0.5, format="%.2f")
-        packing_pct = st.slider("Packing efficiency (%)", min_value=50, max_value=95, value=75)
-        eff_area = usable * (packing_pct / 100.0)
-        st.write(f"Effective area: **{eff_area:.2f} m²**")
-    with right:
-        monthly = st.number_input("Monthly target (kWh/month)", value=150.0, min_value=0.0, step=1.0, format="%.1f")
-        losses_pct = st.slider("System losses (%)", 5, 30, 14)
-        
-        # Tilt calculation is kept as it is based only on latitude
-        tilt = suggest_tilt(st.session_state.lat)
-        st.write(f"Suggested annual tilt (based on selected latitude): **{tilt:.1f}°**")
 
-    st.markdown("---")
-    
-    # panel catalog
-    catalog = [
-        {"name": "400W", "Wp": 400.0, "area": 2.0},
-        {"name": "330W", "Wp": 330.0, "area": 1.7},
-        {"name": "275W", "Wp": 275.0, "area": 1.6},
-        {"name": "200W", "Wp": 200.0, "area": 1.2},
-        {"name": "100W", "Wp": 100.0, "area": 0.6},
-        {"name": "50W",  "Wp": 50.0,  "area": 0.3},
-    ]
-
-    st.subheader("3) Compute")
-    
-    # --- Manual Yield Input Section ---
-    st.info(f"Using a general calculation (no external API). Default yield set to **{DEFAULT_YIELD:.1f} kWh/kWp/yr**.")
-    
-    old_yearly_per_kw = st.session_state.yearly_per_kw
-    
-    st.session_state.yearly_per_kw = st.number_input(
-        "Specific yield (kWh/kWp/year)", 
-        value=st.session_state.yearly_per_kw, 
-        min_value=200.0, 
-        step=10.0, 
-        format="%.1f",
-        key="manual_yield_input"
-    )
-    
-    if old_yearly_per_kw != st.session_state.yearly_per_kw:
-        st.session_state.yield_source = "Manual"
-        st.session_state.computation_done = False
+    # The radio stays outside the form so switching the input mode swaps the
+    # widgets immediately; everything else is batched so tweaking a slider no
+    # longer reruns the whole script until Compute is pressed.
+    method = st.radio("Roof input", ("Length × Width", "Usable area (m²)"))
+
+    with st.form("solar_params"):
+        left, right = st.columns(2)
+        with left:
+            if method == "Length × Width":
+                length = st.number_input("Length (m)", value=8.0, min_value=0.5, step=0.1, format="%.2f")
+                width = st.number_input("Width (m)", value=6.0, min_value=0.5, step=0.1, format="%.2f")
+                usable = float(length * width)
+                st.write(f"Area: **{usable:.1f} m²**")
+            else:
+                usable = st.number_input("Usable area (m²)", value=40.0, min_value=0.1, step=0.5, format="%.2f")
+            packing_pct = st.slider("Packing efficiency (%)", min_value=50, max_value=95, value=75)
+            eff_area = usable * (packing_pct / 100.0)
+            st.write(f"Effective area: **{eff_area:.2f} m²**")
+        with right:
+            monthly = st.number_input("Monthly target (kWh/month)", value=150.0, min_value=0.0, step=1.0, format="%.1f")
+            losses_pct = st.slider("System losses (%)", 5, 30, 14)
+
+            # Tilt calculation is kept as it is based only on latitude
+            tilt = suggest_tilt(st.session_state.lat)
+            st.write(f"Suggested annual tilt (based on selected latitude): **{tilt:.1f}°**")
+
+        st.markdown("---")
+
+        st.subheader("3) Compute")
+
+        # --- Manual Yield Input Section ---
+        st.info(f"Using a general calculation (no external API). Default yield set to **{DEFAULT_YIELD:.1f} kWh/kWp/yr**.")
+
+        old_yearly_per_kw = st.session_state.yearly_per_kw
+
+        st.session_state.yearly_per_kw = st.number_input(
+            "Specific yield (kWh/kWp/year)",
+            value=st.session_state.yearly_per_kw,
+            min_value=200.0,
+            step=10.0,
+            format="%.1f",
+            key="manual_yield_input"
+        )
+
+        if old_yearly_per_kw != st.session_state.yearly_per_kw:
+            st.session_state.yield_source = "Manual"
+            st.session_state.computation_done = False
+
+        submitted = st.form_submit_button("Compute")
 
     # Compute button logic
-    if st.button("Compute"):
+    if submitted:
         if st.session_state.yearly_per_kw <= 0:
             st.error("Please enter a valid Specific Yield (> 0).")
             st.session_state.computation_done = False
@@ -207,58 +329,109 @@ def render():
         
     # --- Results Display Section ---
     if st.session_state.computation_done:
+        # pandas is only needed to display/download results; importing it
+        # here keeps page switches that never compute anything lighter.
+        import pandas as pd
+
         
         yearly_per_kw = st.session_state.yearly_per_kw
         monthly_per_kw = yearly_per_kw / 12.0
         losses = losses_pct / 100.0
+
+        # Loss-adjusted yield factors, computed once and reused everywhere
+        yearly_factor = yearly_per_kw * (1.0 - losses)
+        monthly_factor = yearly_factor / 12.0
         
         st.success(f"Site yield ≈ **{yearly_per_kw:.0f}** kWh/kWp/yr (Source: {st.session_state.yield_source})")
         st.info(f"Equivalent monthly yield: **{monthly_per_kw:.1f}** kWh/kWp/month")
 
-        required_kWp = monthly * 12.0 / (yearly_per_kw * (1.0 - losses)) if yearly_per_kw > 0 else float("inf")
+        required_kWp = monthly * 12.0 / yearly_factor if yearly_factor > 0 else float("inf")
         st.markdown(f"**Required installed (incl. {losses_pct}% losses):** **{required_kWp:.2f} kWp**")
 
-        # Calculation of panels and results dataframe
-        rows = []
-        for p in catalog:
-            max_fit = int(math.floor(eff_area / p["area"])) if p["area"] > 0 else 0
-            installed_if_full = max_fit * p["Wp"] / 1000.0
-            prod_month_full = installed_if_full * monthly_per_kw * (1.0 - losses)
-            panels_needed = int(math.ceil(required_kWp * 1000.0 / p["Wp"])) if p["Wp"] > 0 else 10**9
-            fits = panels_needed <= max_fit
-            rows.append({
-                "type": p["name"], "Wp": p["Wp"], "area_m2": p["area"], "max_fit": max_fit,
-                "installed_kWp_if_full": round(installed_if_full, 2), "monthly_prod_if_full": round(prod_month_full, 1),
-                "coverage_if_full_pct": round(prod_month_full / monthly * 100.0, 1) if monthly > 0 else 0.0,
-                "panels_needed_for_target": panels_needed, "fits_target": fits
-            })
-        df = pd.DataFrame(rows)
-        st.dataframe(df)
-        
-        # Ensure best calculation is safe
-        if rows:
-            best = max(rows, key=lambda r: r["coverage_if_full_pct"])
-            st.markdown(f"**Best single-panel when filling roof:** {best['type']} — coverage {best['coverage_if_full_pct']}%")
+        # Panel metrics computed on whole arrays instead of a per-panel loop
+        wp = PANEL_WP
+        panel_area = PANEL_AREA
+        max_fit = np.where(panel_area > 0, eff_area // panel_area, 0).astype(np.int64)
+        installed_if_full = max_fit * wp / 1000.0
+        prod_month_full = installed_if_full * monthly_factor
+        panels_needed = np.where(
+            wp > 0, np.ceil(required_kWp * 1000.0 / wp), 10**9
+        ).astype(np.int64)
+        coverage = (
+            prod_month_full / monthly * 100.0
+            if monthly > 0 else np.zeros(len(PANEL_CATALOG))
+        )
+        # Keep raw numerics and let the frontend format them; rounding
+        # server-side costs a pass over the cells and breaks numeric sorting.
+        df = pd.DataFrame({
+            "type": list(PANEL_NAMES),
+            "Wp": wp,
+            "area_m2": panel_area,
+            "max_fit": max_fit,
+            "installed_kWp_if_full": installed_if_full,
+            "monthly_prod_if_full": prod_month_full,
+            "coverage_if_full_pct": coverage,
+            "panels_needed_for_target": panels_needed,
+            "fits_target": panels_needed <= max_fit,
+        })
+        st.dataframe(
+            df,
+            column_config={
+                "installed_kWp_if_full": st.column_config.NumberColumn(format="%.2f"),
+                "monthly_prod_if_full": st.column_config.NumberColumn(format="%.1f"),
+                "coverage_if_full_pct": st.column_config.NumberColumn(format="%.1f"),
+            },
+        )
+
+        # One argmax over the coverage array replaces the Python max() pass
+        best_idx = int(np.argmax(coverage))
+        st.markdown(
+            f"**Best single-panel when filling roof:** {PANEL_NAMES[best_idx]} "
+            f"— coverage {coverage[best_idx]:.1f}%"
+        )
+
+        # Mixed plan: exact optimum over all panel combinations
+        counts, area_used = mixed_fill(eff_area, wp, panel_area)
+        mixed_kw = float((counts * PANEL_WP).sum()) / 1000.0
+        mixed_month = mixed_kw * monthly_factor
+        parts = [f"{int(n)}× {p['name']}" for n, p in zip(counts, PANEL_CATALOG) if n > 0]
+        st.markdown(
+            f"**Mixed panel plan:** {' + '.join(parts) if parts else 'no panels fit'} — "
+            f"**{mixed_kw:.2f} kWp**, area used **{area_used:.1f} m²**, "
+            f"monthly est: **{mixed_month:.1f} kWh**"
+        )
 
         # partial plan
         st.markdown("---")
         st.subheader("Partial install")
-        pick = st.selectbox("Pick panel type", [p["name"] for p in catalog], key="panel_type_picker")
-        spec = next(p for p in catalog if p["name"] == pick)
-        max_fit = int(math.floor(eff_area / spec["area"])) if spec["area"] > 0 else 0
+        pick = st.selectbox("Pick panel type", list(PANEL_NAMES), key="panel_type_picker")
+        spec = PANEL_BY_NAME[pick]
+        max_fit = int(eff_area // spec["area"]) if spec["area"] > 0 else 0
         st.write(f"Max that fit: {max_fit} pcs")
         if max_fit > 0:
             n = st.number_input("Number to install", min_value=0, max_value=max_fit, value=min(max_fit, 4), step=1, format="%d", key="num_panels_to_install")
             n = int(n)
             inst_kw = n * spec["Wp"] / 1000.0
-            prod_year = inst_kw * yearly_per_kw * (1.0 - losses)
+            prod_year = inst_kw * yearly_factor
             prod_month = prod_year / 12.0
-            st.write(f"- Installed: **{inst_kw:.2f} kWp**, monthly est: **{prod_month:.1f} kWh**, covers **{prod_month/monthly*100.0:.1f}%**")
+            # monthly may legitimately be 0 (min_value=0.0); avoid dividing by it
+            coverage_pct = prod_month / monthly * 100.0 if monthly > 0 else 0.0
+            st.write(f"- Installed: **{inst_kw:.2f} kWp**, monthly est: **{prod_month:.1f} kWh**, covers **{coverage_pct:.1f}%**")
+            if n > 0:
+                grid_cols = int(math.ceil(math.sqrt(n)))
+                grid_rows = -(-n // grid_cols)
+                st.markdown(
+                    svg_grid_preview(grid_rows, grid_cols, n),
+                    unsafe_allow_html=True,
+                )
             out = pd.DataFrame([{"metric": "panel_type", "value": spec["name"]},
                                 {"metric": "panels", "value": n},
                                 {"metric": "installed_kWp", "value": round(inst_kw, 3)},
                                 {"metric": "monthly_prod_kWh", "value": round(prod_month, 2)}])
-            st.download_button("Download partial plan (CSV)", out.to_csv(index=False).encode("utf-8"), "partial_plan.csv", "text/csv")
+            # Write straight into a bytes buffer: no intermediate str + re-encode
+            buf = io.BytesIO()
+            out.to_csv(buf, index=False)
+            st.download_button("Download partial plan (CSV)", buf.getvalue(), "partial_plan.csv", "text/csv")
         else:
             st.error("No panels of that type fit the effective area.")
 
@@ -267,7 +440,9 @@ def render():
             "metric": ["required_kWp", "effective_area_m2", "tilt_deg_suggested", "losses_pct", "site_yearly_kWh_per_kWp", "yield_source"],
             "value": [round(required_kWp, 3), round(eff_area, 3), round(tilt, 1), losses_pct, round(yearly_per_kw, 1), st.session_state.yield_source]
         })
-        st.download_button("Download summary (CSV)", summary.to_csv(index=False).encode("utf-8"), "summary.csv", "text/csv")
+        buf = io.BytesIO()
+        summary.to_csv(buf, index=False)
+        st.download_button("Download summary (CSV)", buf.getvalue(), "summary.csv", "text/csv")
 
 
 if __name__ == "__main__":
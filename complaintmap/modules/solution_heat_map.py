@@ -0,0 +1,13 @@
+"""
+Thin alias kept for the old page name.
+
+The solutions/heatmap page lives in `solutions_page`; importing it here
+means there is a single module object (and a single copy of the solution
+tables and caches) no matter which name callers use.
+"""
+from modules.solutions_page import (  # noqa: F401
+    get_solution,
+    normalize_issue,
+    normalize_issue_series,
+    render,
+)
